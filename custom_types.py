@@ -1,15 +1,12 @@
 import pydantic
 
-class RAGChunkAndSrc(pydantic.BaseModel):
-    chunk: list[str]
-    source_id: str = None
-
 class RAGUpsertResult(pydantic.BaseModel):
     ingested: int
 
 class RAGSearchResult(pydantic.BaseModel):
     contexts: list[str]
     sources: list[str]
+    cached_answer: str | None = None
 
 class RAGQueryResult(pydantic.BaseModel):
     answer: str
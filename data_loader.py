@@ -1,29 +1,147 @@
-from openai import OpenAI
-from llama_index.readers.file import PDFReader
+import asyncio
+import hashlib
+from functools import lru_cache
+import diskcache
+import fitz
+import numpy as np
+import tiktoken
+from openai import OpenAI, AsyncOpenAI
+from llama_index.core import Document
 from llama_index.core.node_parser import SentenceSplitter
 from dotenv import load_dotenv
 
 load_dotenv()
 
 client = OpenAI()
+aclient = AsyncOpenAI()
 EMBEDDING_MODEL = "text-embedding-3-large"
 EMBEDDING_DIM = 3072
+EMBEDDING_MAX_BATCH_TOKENS = 250_000
+EMBEDDING_MAX_BATCH_SIZE = 2048
+EMBEDDING_MAX_CONCURRENCY = 5
+
+cache = diskcache.Cache(".emb_cache")
+# Module-wide so concurrent ingest consumers share one in-flight cap instead of one each
+_embed_slots = asyncio.Semaphore(EMBEDDING_MAX_CONCURRENCY)
 
 splitter = SentenceSplitter(chunk_size=1000, chunk_overlap=200)
 
+def iter_pdf_chunks(file_path: str, pages_per_batch: int = 32):
+    # Yields chunks a few pages at a time so callers can embed while later pages are parsed
+    with fitz.open(file_path) as doc:
+        for start in range(0, doc.page_count, pages_per_batch):
+            pages = (doc[i].get_text("text") for i in range(start, min(start + pages_per_batch, doc.page_count)))
+            documents = [Document(text=text) for text in pages if text.strip()]
+            if not documents:
+                continue
+            nodes = splitter.get_nodes_from_documents(documents)
+            yield [n.get_content() for n in nodes]
+
 def load_and_chunk_pdf(file_path: str):
-    reader = PDFReader()
-    documents = reader.load_data(file=file_path)
-    texts = [d.text for d in documents if getattr(d, 'text', None)]
-    chunked_texts = []
-    for text in texts:
-        chunks = splitter.split_text(text)
-        chunked_texts.extend(chunks)
-    return chunked_texts
-
-def embed_texts(texts: list[str]) -> list[list[float]]:
-    response = client.embeddings.create(
-            input=texts,
-            model=EMBEDDING_MODEL
-    )
-    return [item.embedding for item in response.data]
\ No newline at end of file
+    return [chunk for batch in iter_pdf_chunks(file_path) for chunk in batch]
+
+@lru_cache(maxsize=1)
+def _encoder() -> tiktoken.Encoding:
+    # Loading the BPE ranks may hit the network, so only pay for it when something gets embedded
+    return tiktoken.encoding_for_model(EMBEDDING_MODEL)
+
+def _token_batches(texts: list[str]) -> list[list[int]]:
+    # Group input indices so each request stays under the per-request token/item limits
+    batches = []
+    current = []
+    current_tokens = 0
+    enc = _encoder()
+    for i, text in enumerate(texts):
+        # PDFs about LLMs often contain literal "<|endoftext|>"; count it as text, not a special token
+        n_tokens = len(enc.encode_ordinary(text))
+        if current and (current_tokens + n_tokens > EMBEDDING_MAX_BATCH_TOKENS or len(current) >= EMBEDDING_MAX_BATCH_SIZE):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(i)
+        current_tokens += n_tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def _cache_key(text: str) -> bytes:
+    return hashlib.sha256((EMBEDDING_MODEL + "|" + text).encode()).digest()
+
+def _cached_lookup(texts: list[str]) -> tuple[list[bytes], np.ndarray, list[int]]:
+    keys = [_cache_key(t) for t in texts]
+    vectors = np.empty((len(texts), EMBEDDING_DIM), dtype=np.float32)
+    misses = []
+    for i, key in enumerate(keys):
+        vec = cache.get(key)
+        if vec is None:
+            misses.append(i)
+        else:
+            vectors[i] = vec
+    return keys, vectors, misses
+
+def _store(keys: list[bytes], vectors: np.ndarray, misses: list[int], fresh: np.ndarray) -> np.ndarray:
+    for i, vec in zip(misses, fresh):
+        cache[keys[i]] = vec
+    vectors[misses] = fresh
+    return vectors
+
+def _fill(vectors: np.ndarray, batch: list[int], response) -> None:
+    data = sorted(response.data, key=lambda item: item.index)
+    vectors[batch[0]:batch[-1] + 1] = np.asarray([item.embedding for item in data], dtype=np.float32)
+
+def _embed_uncached(texts: list[str]) -> np.ndarray:
+    vectors = np.empty((len(texts), EMBEDDING_DIM), dtype=np.float32)
+    for batch in _token_batches(texts):
+        response = client.embeddings.create(
+                input=[texts[i] for i in batch],
+                model=EMBEDDING_MODEL
+        )
+        _fill(vectors, batch, response)
+    return vectors
+
+async def _aembed_uncached(texts: list[str]) -> np.ndarray:
+    async def _call(batch: list[int]):
+        async with _embed_slots:
+            return await aclient.embeddings.create(
+                    input=[texts[i] for i in batch],
+                    model=EMBEDDING_MODEL
+            )
+
+    batches = _token_batches(texts)
+    responses = await asyncio.gather(*[_call(b) for b in batches])
+    vectors = np.empty((len(texts), EMBEDDING_DIM), dtype=np.float32)
+    for batch, response in zip(batches, responses):
+        _fill(vectors, batch, response)
+    return vectors
+
+def embed_texts(texts: list[str]) -> np.ndarray:
+    keys, vectors, misses = _cached_lookup(texts)
+    if not misses:
+        return vectors
+    fresh = _embed_uncached([texts[i] for i in misses])
+    return _store(keys, vectors, misses, fresh)
+
+async def aembed_texts(texts: list[str]) -> np.ndarray:
+    keys, vectors, misses = _cached_lookup(texts)
+    if not misses:
+        return vectors
+    fresh = await _aembed_uncached([texts[i] for i in misses])
+    return _store(keys, vectors, misses, fresh)
+
+def embed_query(text: str) -> np.ndarray:
+    key = _cache_key(text)
+    vec = cache.get(key)
+    if vec is None:
+        response = client.embeddings.create(input=[text], model=EMBEDDING_MODEL)
+        vec = np.asarray(response.data[0].embedding, dtype=np.float32)
+        cache[key] = vec
+    return vec
+
+async def aembed_query(text: str) -> np.ndarray:
+    key = _cache_key(text)
+    vec = cache.get(key)
+    if vec is None:
+        response = await aclient.embeddings.create(input=[text], model=EMBEDDING_MODEL)
+        vec = np.asarray(response.data[0].embedding, dtype=np.float32)
+        cache[key] = vec
+    return vec
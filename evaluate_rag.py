@@ -1,45 +1,62 @@
 import os
+import asyncio
 from dotenv import load_dotenv
 from datasets import Dataset
 from ragas import evaluate
 from ragas.metrics import faithfulness, answer_relevancy
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from data_loader import embed_texts
-from vector_db import QdrantStorage
-from openai import OpenAI
+from langchain_openai import ChatOpenAI
+from langchain_core.embeddings import Embeddings
+from data_loader import embed_query, embed_texts, aembed_query
+from vector_db import get_storage
+from prompts import SYSTEM_PROMPT, build_user_content
+from openai import AsyncOpenAI
 import json
+import hashlib
+from pathlib import Path
 from datetime import datetime
 
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-def run_rag_query(question: str, top_k: int = 5) -> dict:
-    query_vector = embed_texts([question])[0]
-    storage = QdrantStorage()
-    search_results = storage.search(query_vector, top_k)
+client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+EVAL_CACHE_DIR = Path(".eval_cache")
+EVAL_CONCURRENCY = 5
+EVAL_TOP_K = 5
+
+class CachedEmbeddings(Embeddings):
+    # RAGAS embeddings backed by the same disk cache as ingestion and retrieval
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return embed_texts(texts).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        return embed_query(text).tolist()
+
+async def arun_rag_query(question: str, top_k: int = 5, retrieval_cache: dict | None = None) -> dict:
+    # Only retrieval is cached; the answer cache is bypassed so every run scores a freshly generated answer
+    if retrieval_cache is not None and question in retrieval_cache:
+        search_results = retrieval_cache[question]["search_results"]
+    else:
+        query_vector = await aembed_query(question)
+        search_results = await get_storage().asearch(query_vector, top_k)
+        if retrieval_cache is not None:
+            retrieval_cache[question] = {"search_results": search_results}
     
     contexts = search_results["contexts"]
     
-    context_block = "\n\n".join(f"- {ctx}" for ctx in contexts)
-    user_content = (
-        "Use the following context to answer the question:\n\n"
-        f"Context:\n{context_block}\n\n"
-        f"Question: {question}\n"
-        "Answer the question based on the context provided."
-    )
+    user_content = build_user_content(question, contexts)
     
-    response = client.chat.completions.create(
+    response = await client.chat.completions.create(
         model="gpt-4o-mini",
         messages=[
-            {"role": "system", "content": "You are a helpful assistant that provides answers based on provided context."},
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": user_content}
         ],
         temperature=0.2,
-        max_tokens=1024
+        max_tokens=1024,
+        stream=True
     )
     
-    answer = response.choices[0].message.content
+    answer = "".join([chunk.choices[0].delta.content or "" async for chunk in response if chunk.choices])
     
     return {
         "question": question,
@@ -48,6 +65,15 @@ def run_rag_query(question: str, top_k: int = 5) -> dict:
         "sources": search_results["sources"]
     }
 
+async def arun_all(questions: list[str], retrieval_cache: dict, top_k: int = EVAL_TOP_K) -> list:
+    sem = asyncio.Semaphore(EVAL_CONCURRENCY)
+
+    async def _one(question: str):
+        async with sem:
+            return await arun_rag_query(question, top_k=top_k, retrieval_cache=retrieval_cache)
+
+    return await asyncio.gather(*[_one(q) for q in questions], return_exceptions=True)
+
 print("RAG System Evaluation with RAGAS")
 print("="*80 + "\n")
 
@@ -59,17 +85,36 @@ test_questions = [
     "What are the main components?"
 ]
 
+# Retrieval for the fixed question set only changes when the indexed corpus does
+storage = get_storage()
+points_count = storage.client.get_collection(storage.collection).points_count
+cache_key = hashlib.sha256(json.dumps({
+    "questions": test_questions,
+    "top_k": EVAL_TOP_K,
+    "points_count": points_count
+}).encode()).hexdigest()
+cache_file = EVAL_CACHE_DIR / f"{cache_key}.json"
+retrieval_cache = json.loads(cache_file.read_text()) if cache_file.exists() else {}
+cached_questions = len(retrieval_cache)
+if cached_questions:
+    print(f"Loaded cached retrieval for {cached_questions} questions from {cache_file}")
+
 print("Running RAG queries...")
 results = []
 
-for i, question in enumerate(test_questions, 1):
+outcomes = asyncio.run(arun_all(test_questions, retrieval_cache, top_k=EVAL_TOP_K))
+
+for i, (question, outcome) in enumerate(zip(test_questions, outcomes), 1):
     print(f"{i}/{len(test_questions)}: {question[:50]}...")
-    try:
-        result = run_rag_query(question)
-        results.append(result)
-        print(f"   Answer: {result['answer'][:80]}...")
-    except Exception as e:
-        print(f"   Error: {e}")
+    if isinstance(outcome, Exception):
+        print(f"   Error: {outcome}")
+    else:
+        results.append(outcome)
+        print(f"   Answer: {outcome['answer'][:80]}...")
+
+if len(retrieval_cache) > cached_questions:
+    EVAL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    cache_file.write_text(json.dumps(retrieval_cache))
 
 if not results:
     print("\nNo results. Make sure documents are indexed in Qdrant.")
@@ -97,7 +142,7 @@ data = {
 dataset = Dataset.from_dict(data)
 
 ragas_llm = ChatOpenAI(model="gpt-4o-mini")
-ragas_embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
+ragas_embeddings = CachedEmbeddings()
 
 result = evaluate(
     dataset,
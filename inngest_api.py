@@ -0,0 +1,40 @@
+import os
+import random
+from functools import lru_cache
+
+# requests is imported on first use so pages can import this module without slowing down page switches
+
+ERROR_BACKOFF_BASE_S = 0.5
+ERROR_BACKOFF_MAX_S = 30
+
+@lru_cache(maxsize=1)
+def http_session():
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    session = requests.Session()
+    # Connect errors are retried; a read timeout on a 30s long-poll is not, or one call could block for minutes
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=Retry(total=2, read=0, backoff_factor=0.1))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def inngest_api_base() -> str:
+    return os.getenv("INNGEST_API_BASE", "http://127.0.0.1:8288/v1")
+
+def error_backoff_s(consecutive_errors: int) -> float:
+    # Jitter keeps several pollers from retrying against a recovering server in lockstep
+    return min(ERROR_BACKOFF_MAX_S, ERROR_BACKOFF_BASE_S * 2 ** consecutive_errors) + random.uniform(0, 0.25)
+
+def fetch_runs(event_id: str, params: dict | None = None) -> list[dict] | None:
+    # None means the API could not be read; [] means it answered with no runs yet
+    import requests
+    try:
+        url = f"{inngest_api_base()}/events/{event_id}/runs"
+        wait_s = (params or {}).get("timeout", 0)
+        resp = http_session().get(url, params=params, timeout=5 + wait_s)
+        resp.raise_for_status()
+        data = resp.json()
+        return data.get("data", [])
+    except (requests.RequestException, ValueError):
+        return None
@@ -1,48 +1,101 @@
 import logging
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import FastAPI
 import inngest
 import inngest.fast_api
 from dotenv import load_dotenv
 import uuid
+import hashlib
 import os
 import datetime
 from inngest.experimental import ai
-from data_loader import load_and_chunk_pdf, embed_texts
-from vector_db import QdrantStorage
-from custom_types import RAGChunkAndSrc, RAGUpsertResult, RAGSearchResult, RAGQueryResult
+from data_loader import iter_pdf_chunks, aembed_query, aembed_texts
+from vector_db import get_storage, get_query_cache
+from prompts import SYSTEM_PROMPT, build_user_content
+from custom_types import RAGUpsertResult, RAGSearchResult, RAGQueryResult
 
 load_dotenv()
 
+logger = logging.getLogger("uvicorn")
+
 inngest_client = inngest.Inngest(
     app_id="rag-project",
-    logger=logging.getLogger("uvicorn"),
+    logger=logger,
     is_production=False,
     serializer=inngest.PydanticSerializer()
 )
 
+INGEST_QUEUE_SIZE = 4
+INGEST_CONSUMERS = 4
+
+def _chunk_ids(source_id: str, n: int, start: int = 0) -> list[str]:
+    # Same IDs as uuid5(NAMESPACE_URL, f"{source_id}:{i}"), hashing the shared prefix only once
+    prefix = hashlib.sha1(uuid.NAMESPACE_URL.bytes + f"{source_id}:".encode())
+    ids = []
+    for i in range(start, start + n):
+        h = prefix.copy()
+        h.update(str(i).encode())
+        ids.append(str(uuid.UUID(bytes=h.digest()[:16], version=5)))
+    return ids
+
 #decorator
 @inngest_client.create_function(
     fn_id="rag: ingest pdf",
     trigger=inngest.TriggerEvent(event="rag/ingest-pdf"),
 )
 async def rag_ingest_pdf(ctx: inngest.Context):
-    async def _load(ctx: inngest.Context) -> RAGChunkAndSrc:
+    async def _upsert(chunks: list[str], source_id: str, content_hash: str | None, offset: int) -> int:
+        # Repeated boilerplate chunks (headers, footers) are embedded once and the vector reused
+        unique_chunks = list(dict.fromkeys(chunks))
+        position = {c: i for i, c in enumerate(unique_chunks)}
+        unique_vectors = await aembed_texts(unique_chunks)
+        vectors = unique_vectors[[position[c] for c in chunks]]
+        ids = _chunk_ids(source_id, len(chunks), start=offset)
+        payloads = [{"source": source_id, "text": chunks[i], "content_hash": content_hash} for i in range(len(chunks))]
+        await get_storage().aupsert(ids, vectors, payloads)
+        return len(ids)
+
+    async def _ingest(ctx: inngest.Context) -> RAGUpsertResult:
         file_path = str(ctx.event.data["pdf_file_path"])
         source_id = str(ctx.event.data.get("source_id", file_path))
-        chunks = load_and_chunk_pdf(file_path)
-        return RAGChunkAndSrc(chunk=chunks, source_id=source_id)
-
-    async def _upsert(chunk_and_src: RAGChunkAndSrc) -> RAGUpsertResult:
-        chunks = chunk_and_src.chunk
-        source_id = chunk_and_src.source_id
-        vectors = embed_texts(chunks)
-        ids = [str(uuid.uuid5(uuid.NAMESPACE_URL, name=f"{source_id}:{i}")) for i in range(len(chunks))]
-        payloads = [{"source": source_id, "text": chunks[i]} for i in range(len(chunks))]
-        QdrantStorage().upsert(ids, vectors, payloads)
-        return RAGUpsertResult(ingested=len(ids))
-
-    chunk_and_src = await ctx.step.run("load-and-chunk-pdf", lambda: _load(ctx), output_type=RAGChunkAndSrc)
-    upsert_result = await ctx.step.run("embed-and-upsert", lambda: _upsert(chunk_and_src), output_type=RAGUpsertResult)
+        # Lets the upload page skip a byte-identical PDF no matter which name it was indexed under
+        content_hash = ctx.event.data.get("content_hash")
+        # A re-uploaded file replaces its previous version; shorter new versions would leave old tail chunks behind
+        await get_storage().adelete_source(source_id)
+        queue = asyncio.Queue(maxsize=INGEST_QUEUE_SIZE)
+        ingested = 0
+
+        async def producer():
+            loop = asyncio.get_running_loop()
+            batches = iter_pdf_chunks(file_path)
+            offset = 0
+            # One dedicated thread: the PDF document is only ever touched from that thread
+            with ThreadPoolExecutor(max_workers=1) as parser:
+                try:
+                    while (chunks := await loop.run_in_executor(parser, next, batches, None)) is not None:
+                        await queue.put((offset, chunks))
+                        offset += len(chunks)
+                finally:
+                    await loop.run_in_executor(parser, batches.close)
+            for _ in range(INGEST_CONSUMERS):
+                await queue.put(None)
+
+        async def consumer():
+            nonlocal ingested
+            while (item := await queue.get()) is not None:
+                offset, chunks = item
+                ingested += await _upsert(chunks, source_id, content_hash, offset)
+
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(producer())
+            for _ in range(INGEST_CONSUMERS):
+                tg.create_task(consumer())
+        # Cached answers that cite this file were built from the chunks just replaced
+        await get_query_cache().adelete_source(source_id)
+        return RAGUpsertResult(ingested=ingested)
+
+    upsert_result = await ctx.step.run("load-embed-and-upsert", lambda: _ingest(ctx), output_type=RAGUpsertResult)
     return upsert_result.model_dump()
 
 @inngest_client.create_function(
@@ -51,22 +104,35 @@ async def rag_ingest_pdf(ctx: inngest.Context):
 )
 async def rag_query_pdf_ai(ctx: inngest.Context):
     async def _search(question: str, top_k: int = 5) -> RAGSearchResult:
-        query_vector = embed_texts([question])[0]
-        search_results = QdrantStorage().search(query_vector, top_k)
+        # Awaited clients throughout: this runs on the uvicorn loop that ingest consumers also share
+        query_vector = await aembed_query(question)
+        # The answer cache is only a shortcut: if Qdrant fails here, answer the query uncached
+        try:
+            cached = await get_query_cache().alookup(query_vector, top_k)
+        except Exception as e:
+            logger.warning(f"Query cache lookup failed: {e}")
+            cached = None
+        if cached:
+            return RAGSearchResult(contexts=cached["contexts"], sources=cached["sources"], cached_answer=cached["answer"])
+        search_results = await get_storage().asearch(query_vector, top_k)
         return RAGSearchResult(contexts=search_results["contexts"], sources=search_results["sources"])
 
+    async def _cache_answer(question: str, answer: str, search_result: RAGSearchResult, top_k: int) -> None:
+        # Query vector comes back from the embedding disk cache, no extra API call
+        query_vector = await aembed_query(question)
+        try:
+            await get_query_cache().astore(question, query_vector, answer, search_result.contexts, search_result.sources, top_k)
+        except Exception as e:
+            logger.warning(f"Query cache store failed: {e}")
+
     question = ctx.event.data["question"]
     top_k = int(ctx.event.data.get("top_k", 5))
 
     search_result = await ctx.step.run("vector-search", lambda: _search(question, top_k), output_type=RAGSearchResult)
-    
-    context_block = "\n\n".join(f"- {ctx}" for ctx in search_result.contexts)
-    user_content = (
-        "Use the following context to answer the question:\n\n"
-        f"Context:\n{context_block}\n\n"
-        f"Question: {question}\n"
-        "Answer the question based on the context provided."
-    )
+    if search_result.cached_answer is not None:
+        return {"answer": search_result.cached_answer, "sources": search_result.sources, "num_contexts": len(search_result.contexts)}
+
+    user_content = build_user_content(question, search_result.contexts)
 
     openai_api_key = os.getenv("OPENAI_API_KEY")
     if not openai_api_key:
@@ -83,13 +149,14 @@ async def rag_query_pdf_ai(ctx: inngest.Context):
             "max_tokens": 1024,
             "temperature": 0.2,
             "messages": [
-                {"role": "system", "content": "You are a helpful assistant that provides answers based on provided context."},
+                {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": user_content}
             ]
         }
     )
 
     answer_text = res["choices"][0]["message"]["content"].strip()
+    await ctx.step.run("cache-answer", lambda: _cache_answer(question, answer_text, search_result, top_k))
     return {"answer": answer_text, "sources": search_result.sources, "num_contexts": len(search_result.contexts)}
 
 app = FastAPI()
@@ -6,6 +6,32 @@ from datetime import datetime
 
 st.set_page_config(page_title="Evaluation Metrics", page_icon="📊", layout="wide")
 
+@st.cache_data
+def load_eval(path: Path, mtime: float) -> dict:
+    return json.loads(path.read_text())
+
+@st.cache_data
+def build_fig(scores: dict) -> go.Figure:
+    fig = go.Figure()
+    
+    fig.add_trace(go.Bar(
+        x=list(scores.keys()),
+        y=list(scores.values()),
+        text=[f"{v*100:.1f}%" for v in scores.values()],
+        textposition='auto',
+        marker_color=['#667eea', '#764ba2']
+    ))
+    
+    fig.update_layout(
+        title="RAGAS Metrics Overview",
+        yaxis_title="Score (0-1)",
+        xaxis_title="Metric",
+        yaxis=dict(range=[0, 1]),
+        height=400,
+        showlegend=False
+    )
+    return fig
+
 st.title("RAG System Evaluation")
 st.markdown("View RAGAS metrics and evaluation results")
 
@@ -47,8 +73,7 @@ with st.sidebar:
     **Answer Relevancy**: Answer addresses question?
     """)
 
-with open(selected_file, 'r') as f:
-    data = json.load(f)
+data = load_eval(selected_file, selected_file.stat().st_mtime)
 
 ragas_scores = data["ragas_scores"]
 detailed_results = data["detailed_results"]
@@ -74,24 +99,7 @@ st.markdown(f"**Average Score:** {avg_score:.3f} ({avg_score*100:.1f}%)")
 
 st.markdown("---")
 
-fig = go.Figure()
-
-fig.add_trace(go.Bar(
-    x=list(ragas_scores.keys()),
-    y=list(ragas_scores.values()),
-    text=[f"{v*100:.1f}%" for v in ragas_scores.values()],
-    textposition='auto',
-    marker_color=['#667eea', '#764ba2']
-))
-
-fig.update_layout(
-    title="RAGAS Metrics Overview",
-    yaxis_title="Score (0-1)",
-    xaxis_title="Metric",
-    yaxis=dict(range=[0, 1]),
-    height=400,
-    showlegend=False
-)
+fig = build_fig(ragas_scores)
 
 st.plotly_chart(fig, use_container_width=True)
 
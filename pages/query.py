@@ -1,17 +1,22 @@
 import asyncio
+import logging
 import time
 import streamlit as st
 import inngest
 from dotenv import load_dotenv
-import os
-import requests
 from datetime import datetime
 from qdrant_client import QdrantClient
+from openai import OpenAI
+from vector_db import QdrantStorage, QdrantQueryCache
+from prompts import SYSTEM_PROMPT, build_user_content
+from inngest_api import error_backoff_s, fetch_runs
 
 load_dotenv()
 
 st.set_page_config(page_title="Query Documents", layout="wide")
 
+logger = logging.getLogger(__name__)
+
 st.markdown("""
     <style>
     .answer-box {
@@ -28,6 +33,57 @@ st.markdown("""
 def get_inngest_client() -> inngest.Inngest:
     return inngest.Inngest(app_id="rag-project", is_production=False)
 
+@st.cache_resource
+def get_qdrant() -> QdrantClient:
+    return QdrantClient(url="http://localhost:6333", grpc_port=6334, prefer_grpc=True, timeout=5)
+
+@st.cache_resource
+def get_page_storage() -> QdrantStorage:
+    return QdrantStorage(client=get_qdrant())
+
+@st.cache_resource
+def get_page_query_cache() -> QdrantQueryCache:
+    return QdrantQueryCache(client=get_qdrant())
+
+@st.cache_resource
+def get_openai() -> OpenAI:
+    return OpenAI()
+
+def stream_rag_query(question: str, top_k: int) -> dict:
+    # Interactive path: run retrieval + generation here so tokens render as they arrive
+    # data_loader drags in PDF parsing and the embedding stack, so only load it when this path is taken
+    from data_loader import embed_query
+    query_vector = embed_query(question)
+    # The answer cache is only a shortcut: if Qdrant fails here, answer the query uncached
+    try:
+        cached = get_page_query_cache().lookup(query_vector, top_k)
+    except Exception as e:
+        logger.warning(f"Query cache lookup failed: {e}")
+        cached = None
+    if cached:
+        st.markdown(cached["answer"])
+        return {"answer": cached["answer"], "sources": cached["sources"], "num_contexts": len(cached["contexts"])}
+
+    search_results = get_page_storage().search(query_vector, top_k)
+    contexts = search_results["contexts"]
+    response = get_openai().chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": build_user_content(question, contexts)}
+        ],
+        temperature=0.2,
+        max_tokens=1024,
+        stream=True
+    )
+    answer = st.write_stream(chunk.choices[0].delta.content or "" for chunk in response if chunk.choices)
+    try:
+        get_page_query_cache().store(question, query_vector, answer, contexts, search_results["sources"], top_k)
+    except Exception as e:
+        # The answer has already streamed to the user; losing the cache entry is harmless
+        logger.warning(f"Query cache store failed: {e}")
+    return {"answer": answer, "sources": search_results["sources"], "num_contexts": len(contexts)}
+
 async def send_rag_query_event(question: str, top_k: int) -> str:
     client = get_inngest_client()
     result = await client.send(
@@ -41,36 +97,41 @@ async def send_rag_query_event(question: str, top_k: int) -> str:
     )
     return result[0] if result else None
 
-def _inngest_api_base() -> str:
-    return os.getenv("INNGEST_API_BASE", "http://127.0.0.1:8288/v1")
-
-def fetch_runs(event_id: str) -> list[dict]:
-    try:
-        url = f"{_inngest_api_base()}/events/{event_id}/runs"
-        resp = requests.get(url, timeout=5)
-        resp.raise_for_status()
-        data = resp.json()
-        return data.get("data", [])
-    except:
-        return []
-
-def wait_for_run_output(event_id: str, timeout_s: float = 120.0, poll_interval_s: float = 0.5) -> dict:
-    start = time.time()
+def wait_for_run_output(event_id: str, timeout_s: float = 120.0, poll_interval_s: float = 0.2, max_poll_interval_s: float = 2.0) -> dict:
+    start = time.monotonic()
+    poll = poll_interval_s
     last_status = "Pending"
+    last_ui = 0.0
+    consecutive_errors = 0
     progress_bar = st.progress(0)
     status_text = st.empty()
     
     while True:
-        elapsed = time.time() - start
-        progress = min(elapsed / timeout_s, 0.99)
-        progress_bar.progress(progress)
+        now = time.monotonic()
+        elapsed = now - start
         
         runs = fetch_runs(event_id)
+        if runs is None:
+            consecutive_errors += 1
+            status_text.text(f"Status: {last_status} (Inngest API unreachable, {consecutive_errors} consecutive errors)")
+            if elapsed > timeout_s:
+                progress_bar.empty()
+                status_text.empty()
+                raise TimeoutError(f"Timed out waiting for answer (last status: {last_status})")
+            # Never back off past the deadline; the next pass raises the timeout on schedule
+            time.sleep(min(error_backoff_s(consecutive_errors), max(0, timeout_s - elapsed)))
+            continue
+        consecutive_errors = 0
+        status = runs[0].get("status", "Running") if runs else last_status
+        # Each progress/text call is a websocket delta; redraw on a status change or once a second
+        if now - last_ui >= 1.0 or status != last_status:
+            progress_bar.progress(min(elapsed / timeout_s, 0.99))
+            status_text.text(f"Status: {status}")
+            last_ui = now
+        
         if runs:
             run = runs[0]
-            status = run.get("status", "Running")
             last_status = status
-            status_text.text(f"Status: {status}")
             
             if status in ("Completed", "Succeeded", "Success", "Finished"):
                 progress_bar.progress(1.0)
@@ -90,7 +151,8 @@ def wait_for_run_output(event_id: str, timeout_s: float = 120.0, poll_interval_s
             status_text.empty()
             raise TimeoutError(f"Timed out waiting for answer (last status: {last_status})")
         
-        time.sleep(poll_interval_s)
+        time.sleep(poll)
+        poll = min(poll * 1.5, max_poll_interval_s)
 
 if 'query_history' not in st.session_state:
     st.session_state.query_history = []
@@ -99,7 +161,7 @@ st.title("Query Your Documents")
 st.markdown("Ask questions and get AI-powered answers based on your document knowledge base")
 
 try:
-    client = QdrantClient(url="http://localhost:6333", timeout=5)
+    client = get_qdrant()
     
     if not client.collection_exists("documents"):
         st.error("No document collection found!")
@@ -134,6 +196,14 @@ with st.sidebar:
         help="How many relevant chunks to retrieve from the vector database"
     )
     
+    # Off by default: the Inngest workflow is the app's query path and the only one that shows up in the
+    # Inngest dashboard (runs, step timings, retries); streaming trades that for faster first tokens
+    stream_answer = st.toggle(
+        "Stream answer",
+        value=False,
+        help="Generate the answer directly from this page and show tokens as they arrive. Faster first tokens, but the query is not run or traced by the Inngest workflow"
+    )
+    
     st.markdown("---")
     st.markdown("### Statistics")
     st.metric("Documents in DB", num_docs)
@@ -171,25 +241,30 @@ if submitted and question and question.strip():
     st.markdown("### Processing Your Query")
     
     try:
-        with st.spinner("Sending query to RAG pipeline..."):
-            event_id = asyncio.run(send_rag_query_event(question.strip(), int(top_k)))
-            if not event_id:
-                raise Exception("Failed to get event ID")
-            st.info(f"Event ID: `{event_id}`")
-        
-        st.markdown("**Searching knowledge base and generating answer...**")
-        output = wait_for_run_output(event_id, timeout_s=120.0)
+        if stream_answer:
+            st.markdown("### Answer")
+            output = stream_rag_query(question.strip(), int(top_k))
+        else:
+            with st.spinner("Sending query to RAG pipeline..."):
+                event_id = asyncio.run(send_rag_query_event(question.strip(), int(top_k)))
+                if not event_id:
+                    raise Exception("Failed to get event ID")
+                st.info(f"Event ID: `{event_id}`")
+            
+            st.markdown("**Searching knowledge base and generating answer...**")
+            output = wait_for_run_output(event_id, timeout_s=120.0)
         
         answer = output.get("answer", "")
         sources = output.get("sources", [])
         num_contexts = output.get("num_contexts", 0)
         
-        st.markdown("### Answer")
-        st.markdown(f"""
-        <div class='answer-box'>
-            {answer}
-        </div>
-        """, unsafe_allow_html=True)
+        if not stream_answer:
+            st.markdown("### Answer")
+            st.markdown(f"""
+            <div class='answer-box'>
+                {answer}
+            </div>
+            """, unsafe_allow_html=True)
         
         col1, col2, col3 = st.columns(3)
         with col1:
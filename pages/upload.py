@@ -1,29 +1,88 @@
 import asyncio
+import concurrent.futures
+import json
+import hashlib
+import shutil
 from pathlib import Path
 import time
+import threading
 import streamlit as st
-import inngest
-from dotenv import load_dotenv
 import os
-import requests
+from inngest_api import http_session, inngest_api_base, error_backoff_s, fetch_runs
 
-load_dotenv()
+# inngest, requests and dotenv are imported on first use: inngest alone pulls in httpx,
+# pydantic and its async stack, which would otherwise slow down every page switch
 
 st.set_page_config(page_title="Upload Documents", layout="wide")
 
 @st.cache_resource
-def get_inngest_client() -> inngest.Inngest:
+def _load_env() -> None:
+    from dotenv import load_dotenv
+    load_dotenv()
+
+_load_env()
+
+@st.cache_resource
+def get_inngest_client():
+    import inngest
     return inngest.Inngest(app_id="rag-project", is_production=False)
 
+@st.cache_resource
+def _loop() -> asyncio.AbstractEventLoop:
+    # One long-lived loop for every async call this page makes, so clients keep their connections
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+def run_async(coro) -> concurrent.futures.Future:
+    return asyncio.run_coroutine_threadsafe(coro, _loop())
+
+@st.cache_data(ttl=10)
+def _pdf_stats(uploads_dir: str, dir_mtime: float) -> tuple[int, int]:
+    # dir_mtime is only a cache key: adding or removing a PDF bumps it and forces a rescan
+    with os.scandir(uploads_dir) as it:
+        entries = [e for e in it if e.name.endswith(".pdf") and e.is_file()]
+    return len(entries), sum(e.stat().st_size for e in entries)
+
+COPY_CHUNK_SIZE = 1 << 20
+
+def upload_digest(file) -> str:
+    digest = hashlib.sha256()
+    file.seek(0)
+    while chunk := file.read(COPY_CHUNK_SIZE):
+        digest.update(chunk)
+    return digest.hexdigest()
+
 def save_uploaded_pdf(file) -> Path:
     uploads_dir = Path("uploaded_docs")
     uploads_dir.mkdir(parents=True, exist_ok=True)
     file_path = uploads_dir / file.name
-    file_bytes = file.getbuffer()
-    file_path.write_bytes(file_bytes)
+    file.seek(0)
+    with open(file_path, "wb") as fh:
+        shutil.copyfileobj(file, fh, COPY_CHUNK_SIZE)
     return file_path
 
-async def send_rag_ingest_event(pdf_path: Path) -> str:
+@st.cache_resource
+def get_qdrant():
+    from qdrant_client import QdrantClient
+    return QdrantClient(url="http://localhost:6333", grpc_port=6334, prefer_grpc=True, timeout=5)
+
+def is_ingested(digest: str) -> bool:
+    # Ask Qdrant rather than a local marker: the points may have been replaced, or the collection wiped
+    from qdrant_client import models
+    try:
+        result = get_qdrant().count(
+            "documents",
+            count_filter=models.Filter(must=[models.FieldCondition(key="content_hash", match=models.MatchValue(value=digest))]),
+            exact=True
+        )
+    except Exception:
+        # No collection yet, or Qdrant unreachable: ingest it and let the workflow report any real failure
+        return False
+    return result.count > 0
+
+async def send_rag_ingest_event(pdf_path: Path, content_hash: str) -> str:
+    import inngest
     client = get_inngest_client()
     result = await client.send(
         inngest.Event(
@@ -31,58 +90,185 @@ async def send_rag_ingest_event(pdf_path: Path) -> str:
             data={
                 "pdf_file_path": str(pdf_path.resolve()),
                 "source_id": pdf_path.name,
+                "content_hash": content_hash,
             },
         )
     )
     return result[0] if result else None
 
-def _inngest_api_base() -> str:
-    return os.getenv("INNGEST_API_BASE", "http://127.0.0.1:8288/v1")
+LONG_POLL_TIMEOUT_S = 30
+# Speculative: not a documented Inngest API parameter. The dev server ignores it and answers at once,
+# which the backoff below handles; a server that honours it holds the request until the status changes
+LONG_POLL_PARAMS = {"wait_for": "status_change"}
+POLL_INTERVAL_S = 0.2
+MAX_POLL_INTERVAL_S = 2.0
 
-def fetch_runs(event_id: str) -> list[dict]:
+def stream_run_status(event_id: str, job: dict, timeout_s: float = 60.0):
+    # Yields the latest run each time its status changes, until the deadline passes
+    import requests
+    deadline = time.monotonic() + timeout_s
+    url = f"{inngest_api_base()}/events/{event_id}/runs"
+    last_status = None
     try:
-        url = f"{_inngest_api_base()}/events/{event_id}/runs"
-        resp = requests.get(url, timeout=5)
-        resp.raise_for_status()
-        data = resp.json()
-        return data.get("data", [])
-    except:
-        return []
-
-def wait_for_run_output(event_id: str, timeout_s: float = 60.0, poll_interval_s: float = 0.5) -> dict:
-    start = time.time()
+        with http_session().get(url, stream=True, headers={"Accept": "text/event-stream"}, timeout=(5, timeout_s)) as resp:
+            resp.raise_for_status()
+            if resp.headers.get("Content-Type", "").startswith("text/event-stream"):
+                for line in resp.iter_lines(decode_unicode=True):
+                    # A stream that keeps sending frames without finishing must still respect timeout_s
+                    if time.monotonic() >= deadline:
+                        return
+                    if not line or not line.startswith("data:"):
+                        continue
+                    runs = json.loads(line[len("data:"):]).get("data", [])
+                    if runs and runs[0].get("status") != last_status:
+                        last_status = runs[0].get("status")
+                        yield runs[0]
+            else:
+                # Server answered with a plain JSON snapshot: use it as the first poll
+                runs = resp.json().get("data", [])
+                if runs:
+                    last_status = runs[0].get("status")
+                    yield runs[0]
+    except (requests.RequestException, ValueError):
+        pass
+
+    # The stream can close before the run finishes; keep watching by polling until the deadline
+    poll = POLL_INTERVAL_S
+    while time.monotonic() < deadline:
+        asked_at = time.monotonic()
+        wait_s = max(1, min(LONG_POLL_TIMEOUT_S, int(deadline - asked_at)))
+        runs = fetch_runs(event_id, params={**LONG_POLL_PARAMS, "timeout": wait_s})
+        if runs is None:
+            job["consecutive_errors"] += 1
+            time.sleep(min(error_backoff_s(job["consecutive_errors"]), max(0, deadline - time.monotonic())))
+            continue
+        job["consecutive_errors"] = 0
+        if runs and runs[0].get("status") != last_status:
+            last_status = runs[0].get("status")
+            yield runs[0]
+        if time.monotonic() - asked_at < poll:
+            # Server ignored the long-poll and answered immediately: fall back to backed-off polling
+            time.sleep(min(poll, max(0, deadline - time.monotonic())))
+            poll = min(poll * 1.5, MAX_POLL_INTERVAL_S)
+
+async def wait_for_run_output_async(event_id: str, job: dict, timeout_s: float = 60.0) -> dict:
     last_status = "Pending"
-    progress_bar = st.progress(0)
-    status_text = st.empty()
+    # Progress is derived from these by the renderer, so the job only changes on status transitions
+    job["started_at"] = time.monotonic()
+    job["timeout_s"] = timeout_s
+    runs = stream_run_status(event_id, job, timeout_s)
     
-    while True:
-        elapsed = time.time() - start
-        progress = min(elapsed / timeout_s, 0.99)
-        progress_bar.progress(progress)
+    # The stream blocks on its socket, so advance it in a worker thread to let other files progress
+    while (run := await asyncio.to_thread(next, runs, None)) is not None:
+        status = run.get("status", "Running")
+        last_status = status
+        job["run_status"] = status
+        
+        if status in ("Completed", "Succeeded", "Success", "Finished"):
+            job["progress"] = 1.0
+            return run.get("output") or {}
         
-        runs = fetch_runs(event_id)
-        if runs:
-            run = runs[0]
-            status = run.get("status", "Running")
-            last_status = status
-            status_text.text(f"Status: {status}")
+        if status in ("Failed", "Cancelled"):
+            raise RuntimeError(f"Function run {status}")
+    
+    raise TimeoutError(f"Timed out waiting for run (last status: {last_status})")
+
+INGEST_CONCURRENCY = 8
+UI_RERUN_S = 2.0
+
+def new_job(file_name: str) -> dict:
+    return {
+        "file": file_name,
+        "status": "running",
+        "stage": "Queued",
+        "run_status": "Pending",
+        "progress": 0.0,
+        "started_at": None,
+        "timeout_s": None,
+        "event_id": None,
+        "consecutive_errors": 0,
+        "chunks": 0,
+        "error": None
+    }
+
+async def ingest_one(file_path: Path, digest: str, job: dict, sem: asyncio.Semaphore) -> None:
+    # Runs on the background loop: report through `job` only, the script thread does the rendering
+    async with sem:
+        try:
+            job["stage"] = "Sending to Inngest workflow..."
+            event_id = await send_rag_ingest_event(file_path, digest)
+            if not event_id:
+                raise Exception("Failed to get event ID")
+            job["event_id"] = event_id
             
-            if status in ("Completed", "Succeeded", "Success", "Finished"):
-                progress_bar.progress(1.0)
-                status_text.text(f"Status: {status}")
-                return run.get("output") or {}
+            job["stage"] = "Processing (chunking, embedding, indexing)..."
+            output = await wait_for_run_output_async(event_id, job, timeout_s=120.0)
             
-            if status in ("Failed", "Cancelled"):
-                progress_bar.empty()
-                status_text.empty()
-                raise RuntimeError(f"Function run {status}")
-        
-        if elapsed > timeout_s:
-            progress_bar.empty()
-            status_text.empty()
-            raise TimeoutError(f"Timed out waiting for run (last status: {last_status})")
-        
-        time.sleep(poll_interval_s)
+            job["chunks"] = output.get("ingested", 0)
+            job["status"] = "success"
+            
+        except TimeoutError as e:
+            job["status"] = "timeout"
+            job["error"] = str(e)
+            
+        except Exception as e:
+            job["status"] = "error"
+            job["error"] = str(e)
+
+@st.cache_resource
+def _ingest_slots() -> asyncio.Semaphore:
+    # Shared by every session; binds to the background loop the first time a job acquires it
+    return asyncio.Semaphore(INGEST_CONCURRENCY)
+
+def submit_ingestion(uploaded_files) -> tuple[list[dict], list[concurrent.futures.Future]]:
+    jobs = [new_job(f.name) for f in uploaded_files]
+    futures = []
+    submitted = set()
+    for uploaded_file, job in zip(uploaded_files, jobs):
+        try:
+            digest = upload_digest(uploaded_file)
+            # Also catches two copies in the same selection, before either has reached Qdrant
+            if digest in submitted or is_ingested(digest):
+                job["status"] = "skipped"
+                continue
+            submitted.add(digest)
+            file_path = save_uploaded_pdf(uploaded_file)
+            job["stage"] = "Saved, waiting for a free ingestion slot..."
+            futures.append(run_async(ingest_one(file_path, digest, job, _ingest_slots())))
+        except OSError as e:
+            job["status"] = "error"
+            job["error"] = str(e)
+    return jobs, futures
+
+def job_progress(job: dict) -> float:
+    if job["progress"] >= 1.0 or job["started_at"] is None:
+        return job["progress"]
+    return min((time.monotonic() - job["started_at"]) / job["timeout_s"], 0.99)
+
+def render_job(job: dict) -> None:
+    st.markdown(f"### `{job['file']}`")
+    if job["event_id"]:
+        st.info(f"Event ID: `{job['event_id']}`")
+    
+    if job["status"] == "running":
+        st.markdown(f"**{job['stage']}**")
+        st.progress(job_progress(job))
+        st.text(f"Status: {job['run_status']}")
+        if job["consecutive_errors"]:
+            st.warning(f"Inngest API unreachable ({job['consecutive_errors']} consecutive errors), backing off")
+    elif job["status"] == "success":
+        st.success(f"""
+        Successfully ingested `{job['file']}`
+        - Chunks indexed: **{job['chunks']}**
+        - Ready for querying!
+        """)
+    elif job["status"] == "skipped":
+        st.info("Already ingested, skipping")
+    elif job["status"] == "timeout":
+        st.error(f"Timeout: {job['error']}")
+        st.warning("The ingestion is still processing. Check Inngest dashboard for status.")
+    else:
+        st.error(f"Error: {job['error']}")
 
 st.title("Upload & Ingest Documents")
 st.markdown("Upload PDF documents to build your RAG knowledge base")
@@ -102,18 +288,24 @@ with st.sidebar:
     
     uploads_dir = Path("uploaded_docs")
     if uploads_dir.exists():
-        pdf_files = list(uploads_dir.glob("*.pdf"))
-        st.metric("Total PDFs Stored", len(pdf_files))
-        if pdf_files:
-            total_size = sum(f.stat().st_size for f in pdf_files)
+        pdf_count, total_size = _pdf_stats(str(uploads_dir), os.stat(uploads_dir).st_mtime)
+        st.metric("Total PDFs Stored", pdf_count)
+        if pdf_count:
             st.metric("Total Size", f"{total_size / 1024 / 1024:.1f} MB")
 
+if "ingest_jobs" not in st.session_state:
+    st.session_state.ingest_jobs = []
+    st.session_state.ingest_futures = []
+
+processing = any(not f.done() for f in st.session_state.ingest_futures)
+
 st.markdown("### Upload PDF Files")
 
 uploaded_files = st.file_uploader(
     "Choose PDF file(s)",
     type=["pdf"],
     accept_multiple_files=True,
+    disabled=processing,
     help="Upload one or more PDF documents to ingest into the RAG system"
 )
 
@@ -131,79 +323,11 @@ if uploaded_files:
     
     st.markdown("---")
     
-    if st.button("Start Ingestion", type="primary", use_container_width=True):
-        results = []
-        
-        for idx, uploaded_file in enumerate(uploaded_files):
-            st.markdown(f"### Processing {idx + 1}/{len(uploaded_files)}: `{uploaded_file.name}`")
-            
-            try:
-                with st.spinner("Saving file..."):
-                    file_path = save_uploaded_pdf(uploaded_file)
-                    st.success(f"Saved to: `{file_path}`")
-                
-                with st.spinner("Sending to Inngest workflow..."):
-                    event_id = asyncio.run(send_rag_ingest_event(file_path))
-                    if event_id:
-                        st.info(f"Event ID: `{event_id}`")
-                    else:
-                        raise Exception("Failed to get event ID")
-                
-                st.markdown("**Processing (chunking, embedding, indexing)...**")
-                output = wait_for_run_output(event_id, timeout_s=120.0)
-                
-                ingested_count = output.get("ingested", 0)
-                
-                st.success(f"""
-                Successfully ingested `{uploaded_file.name}`
-                - Chunks indexed: **{ingested_count}**
-                - Ready for querying!
-                """)
-                
-                results.append({
-                    "file": uploaded_file.name,
-                    "status": "success",
-                    "chunks": ingested_count
-                })
-                
-            except TimeoutError as e:
-                st.error(f"Timeout: {e}")
-                st.warning("The ingestion is still processing. Check Inngest dashboard for status.")
-                results.append({
-                    "file": uploaded_file.name,
-                    "status": "timeout",
-                    "chunks": 0
-                })
-                
-            except Exception as e:
-                st.error(f"Error: {str(e)}")
-                results.append({
-                    "file": uploaded_file.name,
-                    "status": "error",
-                    "chunks": 0
-                })
-            
-            if idx < len(uploaded_files) - 1:
-                st.markdown("---")
-        
-        st.markdown("---")
-        st.markdown("## Ingestion Summary")
-        
-        success_count = sum(1 for r in results if r["status"] == "success")
-        total_chunks = sum(r["chunks"] for r in results)
-        
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.metric("Successful", success_count)
-        with col2:
-            st.metric("Failed", len(results) - success_count)
-        with col3:
-            st.metric("Total Chunks", total_chunks)
-        
-        if success_count > 0:
-            st.success("Documents ingested successfully!")
-            if st.button("Go to Query Page", type="primary", use_container_width=True):
-                st.switch_page("pages/query.py")
+    if st.button("Start Ingestion", type="primary", use_container_width=True, disabled=processing):
+        jobs, futures = submit_ingestion(uploaded_files)
+        st.session_state.ingest_jobs = jobs
+        st.session_state.ingest_futures = futures
+        st.rerun()
 
 else:
     st.markdown("""
@@ -213,6 +337,43 @@ else:
     </div>
     """, unsafe_allow_html=True)
 
+if st.session_state.ingest_jobs:
+    # Jobs run on the background loop; this block only renders their state and schedules the next look
+    results = st.session_state.ingest_jobs
+    st.markdown("---")
+    st.markdown(f"## Ingestion ({len(results)} files)")
+    
+    for idx, job in enumerate(results):
+        render_job(job)
+        if idx < len(results) - 1:
+            st.markdown("---")
+    
+    if processing:
+        time.sleep(UI_RERUN_S)
+        st.rerun()
+    
+    st.markdown("---")
+    st.markdown("## Ingestion Summary")
+    
+    success_count = sum(1 for r in results if r["status"] == "success")
+    skipped_count = sum(1 for r in results if r["status"] == "skipped")
+    total_chunks = sum(r["chunks"] for r in results)
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Successful", success_count)
+    with col2:
+        st.metric("Skipped", skipped_count)
+    with col3:
+        st.metric("Failed", len(results) - success_count - skipped_count)
+    with col4:
+        st.metric("Total Chunks", total_chunks)
+    
+    if success_count > 0:
+        st.success("Documents ingested successfully!")
+        if st.button("Go to Query Page", type="primary", use_container_width=True):
+            st.switch_page("pages/query.py")
+
 st.markdown("---")
 st.markdown("### Monitor Your Ingestion")
 
@@ -0,0 +1,12 @@
+SYSTEM_PROMPT = "You are a helpful assistant that provides answers based on provided context."
+USER_PROMPT_TMPL = (
+    "Use the following context to answer the question:\n\n"
+    "Context:\n{context}\n\n"
+    "Question: {question}\n"
+    "Answer the question based on the context provided."
+)
+_PREFIX = "- "
+
+def build_user_content(question: str, contexts: list[str]) -> str:
+    context_block = "\n\n".join([_PREFIX + c for c in contexts])
+    return USER_PROMPT_TMPL.format(context=context_block, question=question)
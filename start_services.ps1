@@ -21,10 +21,10 @@ if (Test-Port -Port 6333) {
     Write-Host "Qdrant is already running" -ForegroundColor Green
 } else {
     Write-Host "Qdrant is not running" -ForegroundColor Red
-    Write-Host "Start Qdrant with: docker run -p 6333:6333 qdrant/qdrant" -ForegroundColor Yellow
+    Write-Host "Start Qdrant with: docker run -p 6333:6333 -p 6334:6334 qdrant/qdrant" -ForegroundColor Yellow
     $startQdrant = Read-Host "Do you want to start Qdrant now? (y/n)"
     if ($startQdrant -eq "y") {
-        Start-Process powershell -ArgumentList "-NoExit", "-Command", "docker run -p 6333:6333 qdrant/qdrant"
+        Start-Process powershell -ArgumentList "-NoExit", "-Command", "docker run -p 6333:6333 -p 6334:6334 qdrant/qdrant"
         Write-Host "Waiting for Qdrant to start..." -ForegroundColor Yellow
         Start-Sleep -Seconds 5
     }
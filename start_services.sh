@@ -16,13 +16,13 @@ if nc -z localhost 6333 2>/dev/null; then
     echo "Qdrant is already running"
 else
     echo "Qdrant is not running"
-    echo "Start Qdrant with: docker run -p 6333:6333 qdrant/qdrant"
+    echo "Start Qdrant with: docker run -p 6333:6333 -p 6334:6334 qdrant/qdrant"
     read -p "Do you want to start Qdrant now? (y/n) " -n 1 -r
     echo
     if [[ $REPLY =~ ^[Yy]$ ]]; then
-        gnome-terminal -- bash -c "docker run -p 6333:6333 qdrant/qdrant; exec bash" 2>/dev/null || \
-        osascript -e 'tell app "Terminal" to do script "docker run -p 6333:6333 qdrant/qdrant"' 2>/dev/null || \
-        xterm -e "docker run -p 6333:6333 qdrant/qdrant" 2>/dev/null &
+        gnome-terminal -- bash -c "docker run -p 6333:6333 -p 6334:6334 qdrant/qdrant; exec bash" 2>/dev/null || \
+        osascript -e 'tell app "Terminal" to do script "docker run -p 6333:6333 -p 6334:6334 qdrant/qdrant"' 2>/dev/null || \
+        xterm -e "docker run -p 6333:6333 -p 6334:6334 qdrant/qdrant" 2>/dev/null &
         echo "Waiting for Qdrant to start..."
         sleep 5
     fi
@@ -1,6 +1,6 @@
+import os
 import streamlit as st
 from pathlib import Path
-from qdrant_client import QdrantClient
 
 st.set_page_config(
     page_title="RAG Orchestrator",
@@ -8,6 +8,24 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+@st.cache_resource
+def qdrant_client():
+    # Imported lazily so the landing page renders before the qdrant/grpc stack is loaded
+    from qdrant_client import QdrantClient
+    return QdrantClient(url="http://localhost:6333", grpc_port=6334, prefer_grpc=True, timeout=2)
+
+@st.cache_data(ttl=5)
+def documents_indexed() -> int | None:
+    client = qdrant_client()
+    if not client.collection_exists("documents"):
+        return None
+    return client.get_collection("documents").points_count
+
+@st.cache_data(ttl=10)
+def _pdf_count(uploads_dir: str, dir_mtime: float) -> int:
+    with os.scandir(uploads_dir) as it:
+        return sum(1 for e in it if e.name.endswith(".pdf") and e.is_file())
+
 st.markdown("""
     <style>
     .main-header {
@@ -40,11 +58,10 @@ with st.sidebar:
     st.markdown("### System Status")
     
     try:
-        client = QdrantClient(url="http://localhost:6333", timeout=2)
-        if client.collection_exists("documents"):
-            info = client.get_collection("documents")
+        points_count = documents_indexed()
+        if points_count is not None:
             st.success("Qdrant Online")
-            st.metric("Documents Indexed", info.points_count)
+            st.metric("Documents Indexed", points_count)
         else:
             st.warning("No collection yet")
     except:
@@ -55,7 +72,7 @@ with st.sidebar:
     
     uploads_dir = Path("uploaded_docs")
     if uploads_dir.exists():
-        pdf_count = len(list(uploads_dir.glob("*.pdf")))
+        pdf_count = _pdf_count(str(uploads_dir), os.stat(uploads_dir).st_mtime)
         st.metric("Uploaded PDFs", pdf_count)
 
 st.markdown("---")
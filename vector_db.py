@@ -1,9 +1,28 @@
-from qdrant_client import QdrantClient
-from qdrant_client.models import VectorParams, Distance, PointStruct
+import time
+import uuid
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import numpy as np
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from qdrant_client.models import (
+    VectorParams, Distance, Batch, Filter, FieldCondition, MatchValue, MatchAny, PayloadSchemaType, FilterSelector,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType, SearchParams, QuantizationSearchParams
+)
+
+UPSERT_BATCH_SIZE = 256
+UPSERT_WORKERS = 4
 
 class QdrantStorage:
-    def __init__(self, url="http://localhost:6333", collection="documents", dim=3072):
-        self.client = QdrantClient(url=url, timeout=30)
+    payload_indexes = {"source": PayloadSchemaType.KEYWORD, "content_hash": PayloadSchemaType.KEYWORD}
+    source_field = "source"
+
+    def __init__(self, url="http://localhost:6333", collection="documents", dim=3072, client: QdrantClient | None = None,
+                 grpc_port: int = 6334):
+        self.url = url
+        self.grpc_port = grpc_port
+        self.client = client or QdrantClient(url=url, grpc_port=grpc_port, prefer_grpc=True, timeout=30)
+        self._aclient = None
         self.collection = collection
         self.dim = dim
         
@@ -11,7 +30,11 @@ class QdrantStorage:
             try:
                 self.client.create_collection(
                     collection_name=self.collection,
-                    vectors_config=VectorParams(size=dim, distance=Distance.COSINE)
+                    vectors_config=VectorParams(size=dim, distance=Distance.COSINE, on_disk=True),
+                    on_disk_payload=True,
+                    quantization_config=ScalarQuantization(
+                        scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+                    )
                 )
                 print(f"Created collection: {self.collection}")
             except Exception as e:
@@ -21,28 +44,153 @@ class QdrantStorage:
                     print(f"Using existing collection: {self.collection}")
                 except:
                     raise
+        
+        for field_name, field_schema in self.payload_indexes.items():
+            try:
+                self.client.create_payload_index(self.collection, field_name=field_name, field_schema=field_schema)
+            except Exception as e:
+                print(f"Payload index on {field_name} not created: {e}")
+
+    @property
+    def aclient(self) -> AsyncQdrantClient:
+        # Created on first use so it binds to the event loop that actually awaits it
+        if self._aclient is None:
+            self._aclient = AsyncQdrantClient(url=self.url, grpc_port=self.grpc_port, prefer_grpc=True, timeout=30)
+        return self._aclient
+
+    def _as_vectors(self, vectors) -> np.ndarray:
+        if not isinstance(vectors, np.ndarray):
+            vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.dtype != np.float32 or vectors.ndim != 2 or vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected float32 vectors of shape (N, {self.dim}), got {vectors.dtype} {vectors.shape}")
+        return vectors
 
-    def upsert(self, ids, vectors, payloads):
-        points = [
-            PointStruct(id=ids[i], vector=vectors[i], payload=payloads[i])
-            for i in range(len(ids))
+    def _point_batches(self, ids, vectors: np.ndarray, payloads):
+        # Columnar Batch: one tolist() per slice instead of a validated PointStruct per point
+        vectors = self._as_vectors(vectors)
+        return [
+            Batch(
+                ids=list(ids[start:start + UPSERT_BATCH_SIZE]),
+                vectors=vectors[start:start + UPSERT_BATCH_SIZE].tolist(),
+                payloads=list(payloads[start:start + UPSERT_BATCH_SIZE])
+            )
+            for start in range(0, len(ids), UPSERT_BATCH_SIZE)
         ]
-        self.client.upsert(self.collection, points=points)
 
-    def search(self, query_vector, top_k: int = 5):
-        results = self.client.query_points(
+    def upsert(self, ids, vectors: np.ndarray, payloads):
+        batches = self._point_batches(ids, vectors, payloads)
+        if not batches:
+            return
+        # Earlier batches are only acknowledged; waiting on the last one covers them all
+        if len(batches) > 1:
+            with ThreadPoolExecutor(max_workers=UPSERT_WORKERS) as pool:
+                list(pool.map(lambda batch: self.client.upsert(self.collection, points=batch, wait=False), batches[:-1]))
+        self.client.upsert(self.collection, points=batches[-1])
+
+    async def aupsert(self, ids, vectors: np.ndarray, payloads):
+        batches = self._point_batches(ids, vectors, payloads)
+        if not batches:
+            return
+        await asyncio.gather(*[self.aclient.upsert(self.collection, points=batch, wait=False) for batch in batches[:-1]])
+        await self.aclient.upsert(self.collection, points=batches[-1])
+
+    def _source_selector(self, source_id: str) -> FilterSelector:
+        return FilterSelector(filter=Filter(must=[FieldCondition(key=self.source_field, match=MatchValue(value=source_id))]))
+
+    async def adelete_source(self, source_id: str):
+        await self.aclient.delete(self.collection, points_selector=self._source_selector(source_id))
+
+    def _search_kwargs(self, query_vector, top_k: int, source_filter: list[str] | None = None):
+        query_filter = None
+        if source_filter:
+            query_filter = Filter(must=[FieldCondition(key="source", match=MatchAny(any=source_filter))])
+        return dict(
             collection_name=self.collection,
             query=query_vector,
+            query_filter=query_filter,
             limit=top_k,
+            with_payload=True,
+            search_params=SearchParams(quantization=QuantizationSearchParams(rescore=True, oversampling=2.0))
+        )
+
+    @staticmethod
+    def _to_search_result(results):
+        payloads = [r.payload for r in results if r.payload]
+        contexts = [pl["text"] for pl in payloads if pl.get("text")]
+        sources = list(dict.fromkeys(pl["source"] for pl in payloads if pl.get("text") and pl.get("source")))
+        return {"contexts": contexts, "sources": sources}
+
+    def search(self, query_vector, top_k: int = 5, source_filter: list[str] | None = None):
+        results = self.client.query_points(**self._search_kwargs(query_vector, top_k, source_filter)).points
+        return self._to_search_result(results)
+
+    async def asearch(self, query_vector, top_k: int = 5, source_filter: list[str] | None = None):
+        results = (await self.aclient.query_points(**self._search_kwargs(query_vector, top_k, source_filter))).points
+        return self._to_search_result(results)
+
+class QdrantQueryCache(QdrantStorage):
+    payload_indexes = {"top_k": PayloadSchemaType.INTEGER, "sources": PayloadSchemaType.KEYWORD}
+    # Matching a source against the cited-sources list drops every answer built from that file
+    source_field = "sources"
+
+    def __init__(self, url="http://localhost:6333", collection="query_cache", dim=3072,
+                 score_threshold: float = 0.92, ttl_s: float = 24 * 3600, client: QdrantClient | None = None):
+        super().__init__(url=url, collection=collection, dim=dim, client=client)
+        self.score_threshold = score_threshold
+        self.ttl_s = ttl_s
+
+    def _lookup_kwargs(self, query_vector, top_k: int):
+        return dict(
+            collection_name=self.collection,
+            query=query_vector,
+            query_filter=Filter(must=[FieldCondition(key="top_k", match=MatchValue(value=top_k))]),
+            limit=1,
+            score_threshold=self.score_threshold,
             with_payload=True
-        ).points
-        contexts = []
-        sources = set()
-        for result in results:
-            payload = getattr(result, 'payload', None) or {}
-            text = payload.get('text', '')
-            source = payload.get('source', '')
-            if text:
-                contexts.append(text)
-                sources.add(source)
-        return {"contexts": contexts, "sources": list(sources)}
\ No newline at end of file
+        )
+
+    def _fresh_payload(self, results):
+        if not results:
+            return None
+        payload = results[0].payload or {}
+        if time.time() - payload.get("created_at", 0) > self.ttl_s:
+            return None
+        return payload
+
+    @staticmethod
+    def _entry(question: str, answer: str, contexts: list[str], sources: list[str], top_k: int):
+        point_id = str(uuid.uuid5(uuid.NAMESPACE_URL, name=f"{top_k}:{question}"))
+        payload = {
+            "question": question,
+            "answer": answer,
+            "contexts": contexts,
+            "sources": sources,
+            "top_k": top_k,
+            "created_at": time.time()
+        }
+        return point_id, payload
+
+    def lookup(self, query_vector, top_k: int = 5):
+        results = self.client.query_points(**self._lookup_kwargs(query_vector, top_k)).points
+        return self._fresh_payload(results)
+
+    async def alookup(self, query_vector, top_k: int = 5):
+        results = (await self.aclient.query_points(**self._lookup_kwargs(query_vector, top_k))).points
+        return self._fresh_payload(results)
+
+    def store(self, question: str, query_vector, answer: str, contexts: list[str], sources: list[str], top_k: int = 5):
+        point_id, payload = self._entry(question, answer, contexts, sources, top_k)
+        self.upsert([point_id], [query_vector], [payload])
+
+    async def astore(self, question: str, query_vector, answer: str, contexts: list[str], sources: list[str], top_k: int = 5):
+        point_id, payload = self._entry(question, answer, contexts, sources, top_k)
+        await self.aupsert([point_id], [query_vector], [payload])
+
+
+@lru_cache(maxsize=1)
+def get_storage() -> QdrantStorage:
+    return QdrantStorage()
+
+@lru_cache(maxsize=1)
+def get_query_cache() -> QdrantQueryCache:
+    return QdrantQueryCache()